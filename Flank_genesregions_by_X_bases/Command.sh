@@ -4,3 +4,6 @@
 ./flank_genesregions_by_X_bases.py sample_input.bed sample_output_3_2.bed 2000 3 2
 ./flank_genesregions_by_X_bases.py sample_input.bed sample_output_both_1.bed 2000 both 1
 ./flank_genesregions_by_X_bases.py sample_input.bed sample_output_both_2.bed 2000 both 2
+
+./flank_genesregions_by_X_bases.py sample_input.bed sample_output_both_1_merged.bed 2000 both 1 --merged=sample_merged.bed --stats=sample_stats.json
+./flank_genesregions_by_X_bases.py sample_input.bed sample_output_both_1_clamped.bed 2000 both 1 --genome=hg38
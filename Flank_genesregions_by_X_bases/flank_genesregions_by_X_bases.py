@@ -1,7 +1,17 @@
 #!/usr/bin/env python3
 # Written by Alex Ding, 2018
 
-import sys
+import os, sys
+import glob
+import json
+
+# the shared barc package lives at the root of the repository
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, REPO_DIR)
+# genome_inventory (imported when --genome is given) lives in nfs_genomes_html
+sys.path.insert(1, os.path.join(REPO_DIR, "nfs_genomes_html"))
+from barc import fastio
+from barc.instrument import Instrument, INSTRUMENT_USAGE
 
 PROGRAM_DESCRIPTION = """
 This program takes in a bed-formatted file and a maximum number
@@ -14,7 +24,23 @@ USAGE_DESCRIPTION = """
 Usage: %s <input_filename> <output_filename> <bp_limit> 
  <stream_direction> ("5", "3", or "both") [strand_direction=1 (1 or 2)]
 Example: %s sample_input.bed sample_output.bed 2000 5
-""" % (sys.argv[0], sys.argv[0])
+Options:
+ --merged=FILE   also write the flanks merged per chromosome into
+                 non-overlapping regions (BED: chrom start end 5/3 count)
+ --stats=FILE    also write JSON statistics: histogram of the clamped
+                 distances, flanks cut to 0 by overlaps and covered bases
+                 (flanks cut at a chromosome end are counted apart)
+ --genome=GENOME keep flanks within the chromosomes: GENOME is a chrom.sizes
+                 file, or an alias or directory under $GENOMES_DIR
+                 (default /nfs/genomes) holding one
+""" % (sys.argv[0], sys.argv[0]) + INSTRUMENT_USAGE
+# number of bins between 0 and bp_limit in the distance histogram
+HISTOGRAM_BINS = 10
+GENOMES_DIR = os.environ.get("GENOMES_DIR", "/nfs/genomes")
+# where chromosome sizes are looked for in a genome directory, in order;
+# .fai indexes have the chromosome and its length in the first two columns
+CHROM_SIZES_PATTERNS = ["*.chrom.sizes", "chrom.sizes", "anno/*.chrom.sizes", "anno/chrom.sizes",
+                        "fasta_whole_genome/*.fai", "fasta/*.fai"]
 
 def print_and_exit(message):
     """prints the error message and exits"""
@@ -101,92 +127,253 @@ def find_closest_one_direction(starts, ends, directions, bp_limit, from_id, gene
                     return bp_limit
         return bp_limit
 
-def write_output(output, chr, start, end, gene_name, direction, dist, gene_direction):
-    output.write(chr+"\t")
+def flank_interval(start, end, direction, dist, gene_direction, chr_size=None):
+    """returns the (start, end) of the flank, or None if the strand is neither + nor -;
+    if chr_size is given the flank is kept within 0 and chr_size"""
     if (gene_direction == "5" and direction == "+") or (gene_direction == "3" and direction == "-"):
         # start and end are of the buffer
         # depends on the direction, get the right start and end
-        output.write(str(start-dist)+"\t")
-        output.write(str(start)+"\t")
+        return (start-dist if chr_size is None else max(start-dist, 0)), start
     # analogous but reversed
     elif (gene_direction == "3" and direction=="+") or (gene_direction == "5" and direction == "-"):
-        output.write(str(end)+"\t")
-        output.write(str(end+dist)+"\t")
+        return end, (end+dist if chr_size is None else max(min(end+dist, chr_size), end))
+    return None
+
+def write_output(output, chr, start, end, gene_name, direction, dist, gene_direction, chr_size=None):
+    """writes one flank and returns its (start, end) (or None)"""
+    flank = flank_interval(start, end, direction, dist, gene_direction, chr_size)
+    output.write(chr+"\t")
+    if flank is not None:
+        output.write(str(flank[0])+"\t")
+        output.write(str(flank[1])+"\t")
+        # shorter if it hit the end of the chromosome
+        dist = flank[1] - flank[0]
     # common tasks that both directions have to do
     output.write(gene_name+"_"+gene_direction+"_"+str(dist)+"\t")
     output.write("1\t")
     output.write(direction+"\n")
+    return flank
 
-def write_outputs(output_filename, chrs, starts, ends, gene_names, directions, dists, gene_direction):
-    """writes the output bed file from the accumulated info"""
-    with open(output_filename, "w") as output:
+def write_outputs(output_filename, chrs, starts, ends, gene_names, directions, dists, gene_direction, instrument,
+                  flanks=None, chr_sizes=None):
+    """writes the output bed file from the accumulated info; if flanks is
+    a dict, the flanks are also collected in it by (chrom, 5 or 3)
+    as (start, end, dist, cut at the chromosome end) for merging, dist
+    being the distance allowed by the neighbouring genes; if chr_sizes is given, flanks are
+    kept within the chromosomes"""
+    # without a size, a chromosome missing from chr_sizes is only kept above 0
+    unbounded = float("inf") if chr_sizes is not None else None
+    with instrument.stage("write", total=len(chrs)), fastio.open_output(output_filename, text=True) as output:
         # go through each one and write the output
         for i in range(0, len(chrs)):
+            if i % 4096 == 0:
+                instrument.progress(i)
             # dispatch according to the direction(s) we go to
             if gene_direction == "both":
-                write_output(output, chrs[i], starts[i], ends[i], gene_names[i], directions[i], dists[2*i], "5")
-                write_output(output, chrs[i], starts[i], ends[i], gene_names[i], directions[i], dists[2*i+1], "3")
-            elif gene_direction == "5":
-                write_output(output, chrs[i], starts[i], ends[i], gene_names[i], directions[i], dists[i], "5")
+                todo = ((dists[2*i], "5"), (dists[2*i+1], "3"))
             else:
-                write_output(output, chrs[i], starts[i], ends[i], gene_names[i], directions[i], dists[i], "3")
+                todo = ((dists[i], gene_direction),)
+            for dist, flank_direction in todo:
+                chr_size = unbounded if chr_sizes is None else chr_sizes.get(chrs[i], unbounded)
+                flank = write_output(output, chrs[i], starts[i], ends[i], gene_names[i], directions[i],
+                                           dist, flank_direction, chr_size)
+                if flanks is not None and flank is not None:
+                    flanks.setdefault((chrs[i], flank_direction), []).append(
+                        (flank[0], flank[1], dist, flank[1] - flank[0] < dist))
+
+def merge_intervals(intervals):
+    """merges (start, end, ...) intervals that overlap or touch into
+    sorted [start, end, count] lists, skipping empty ones"""
+    merged = []
+    for interval in sorted(intervals):
+        start, end = interval[0], interval[1]
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+            merged[-1][2] += 1
+        else:
+            merged.append([start, end, 1])
+    return merged
+
+def write_merged(merged_filename, merged):
+    """writes the merged regions sorted by chromosome and start"""
+    rows = sorted((chr, start, end, flank_direction, count)
+                  for (chr, flank_direction), regions in merged.items()
+                  for start, end, count in regions)
+    with fastio.open_output(merged_filename, text=True) as output:
+        for row in rows:
+            output.write("%s\t%d\t%d\t%s\t%d\n" % row)
+
+def flank_stats(flanks, merged, bp_limit):
+    """summary statistics of the flanks and of the merged regions"""
+    width = max(1, -(-bp_limit // HISTOGRAM_BINS))
+    histogram = dict(("%d-%d" % (lo, min(lo+width, bp_limit)-1), 0) for lo in range(0, bp_limit, width))
+    total = clamped = zero = chrom_end = 0
+    for intervals in flanks.values():
+        for _, _, dist, at_chrom_end in intervals:
+            total += 1
+            if at_chrom_end:
+                chrom_end += 1
+            # a distance below bp_limit was cut short by a neighbouring gene
+            if dist < bp_limit:
+                clamped += 1
+                lo = dist // width * width
+                histogram["%d-%d" % (lo, min(lo+width, bp_limit)-1)] += 1
+            if dist == 0:
+                zero += 1
+    covered = {"5": 0, "3": 0}
+    regions = {"5": 0, "3": 0}
+    for (_, flank_direction), intervals in merged.items():
+        covered[flank_direction] += sum(end-start for start, end, _ in intervals)
+        regions[flank_direction] += len(intervals)
+    # 5' and 3' flanks of neighbouring genes can overlap each other
+    by_chr = {}
+    for (chr, _), intervals in merged.items():
+        by_chr.setdefault(chr, []).extend(intervals)
+    covered["total"] = sum(end-start for intervals in by_chr.values()
+                           for start, end, _ in merge_intervals(intervals))
+    return {"bp_limit": bp_limit, "flanks": total, "full_length": total-clamped,
+            "clamped": clamped, "zero_length": zero, "clamped_histogram": histogram,
+            "chrom_end_clamped": chrom_end,
+            "merged_regions": regions, "covered_bases": covered}
+
+def write_summaries(flanks, bp_limit, merged_filename, stats_filename, instrument):
+    """merges the collected flanks and writes the requested extra outputs"""
+    with instrument.stage("merge", total=len(flanks)):
+        merged = dict((key, merge_intervals(intervals)) for key, intervals in flanks.items())
+        if merged_filename is not None:
+            write_merged(merged_filename, merged)
+        if stats_filename is not None:
+            with open(stats_filename, "w") as f:
+                json.dump(flank_stats(flanks, merged, bp_limit), f, indent=1)
+                f.write("\n")
 
-def read_input_and_dispatch(input_filename, output_filename, bp_limit, gene_direction, direction):
+def load_chrom_sizes(file_names):
+    """reads chromosome sizes (first two columns) from a tuple of files
+    into a dict"""
+    sizes = {}
+    for file_name in file_names:
+        with fastio.open_input(file_name) as f:
+            for batch in fastio.read_fields(f, columns=(0, 1)):
+                for chr, size in batch:
+                    sizes[chr.decode()] = int(size)
+    return sizes
+
+def find_chrom_sizes(genome):
+    """returns the chrom.sizes (or .fai) files for a genome given as a file,
+    an alias known to the genome inventory or a directory under GENOMES_DIR"""
+    if os.path.isfile(genome):
+        return (genome,)
+    directory = None
+    try:
+        # the inventory written by nfs_genomes_html knows every alias
+        from nfs_genome_html import default_inventory_file
+        from genome_inventory import GenomeIndex
+        index = GenomeIndex.load(default_inventory_file(GENOMES_DIR))
+    except (ImportError, EnvironmentError, KeyError, ValueError):
+        # no usable inventory, only folder names work
+        index = None
+    if index is not None:
+        try:
+            directory = index.path(genome)
+        except KeyError:
+            pass
+        except ValueError as e:
+            # several genomes have this alias
+            raise EnvironmentError(e.args[0])
+    if directory is None or not os.path.isdir(directory):
+        directory = os.path.join(GENOMES_DIR, genome)
+    if not os.path.isdir(directory):
+        raise EnvironmentError("Unknown genome %s: not a file, an alias or a folder in %s" % (genome, GENOMES_DIR))
+    for pattern in CHROM_SIZES_PATTERNS:
+        file_names = sorted(glob.glob(os.path.join(directory, pattern)))
+        if file_names:
+            return tuple(file_names)
+    raise EnvironmentError("No chrom.sizes or .fai file in %s" % directory)
+
+def read_input_and_dispatch(input_filename, output_filename, bp_limit, gene_direction, direction, instrument,
+                            merged_filename=None, stats_filename=None, genome=None):
     """read input from file and dispatches to the right algorithm"""
+    chr_sizes = None
+    if genome is not None:
+        try:
+            chr_sizes = load_chrom_sizes(find_chrom_sizes(genome))
+        except EnvironmentError as e:
+            print_and_exit(str(e))
+        except (IndexError, ValueError):
+            print_and_exit("Incorrect chromosome sizes for %s! Line Format: chrom size ..." % genome)
     chrs = []
     starts = []
     ends = []
     gene_names = []
     directions = []
     try:
-        input_file = open(input_filename)
-        # line by line and build up the initialized arrays
-        for line in input_file:
-            vals = line.split("\t") # get individual lines and read the different parts
-            chrs.append(vals[0])
-            starts.append(int(vals[1]))
-            ends.append(int(vals[2]))
-            gene_names.append(vals[3])
-            directions.append(vals[5])
-        input_file.close()
+        with fastio.open_input(input_filename) as input_file, \
+             instrument.stage("parse", total=fastio.input_size(input_file)):
+            # block by block, only keeping the columns we need:
+            # chrom start end name direction
+            for batch in fastio.read_fields(input_file, columns=(0, 1, 2, 3, 5), progress=instrument.progress):
+                instrument.count(len(batch))
+                for vals in batch:
+                    chrs.append(vals[0].decode())
+                    starts.append(int(vals[1]))
+                    ends.append(int(vals[2]))
+                    gene_names.append(vals[3].decode())
+                    directions.append(vals[4].decode())
     except EnvironmentError: # if file cannot be opened
         print_and_exit("Invalid input file! Cannot open %s\n" % input_filename)
     except IndexError:
         print_and_exit("Incorrect file foramt! Check format for .bed files.\n"
                        + "Line Format: chrom start end name score direction ...")
    
-    # sort inputs by starts
-    result = sorted(zip(chrs, starts, ends, gene_names, directions), key=lambda tup:tup[1])
-    # unpack the sorted input
-    chrs = [x[0] for x in result]
-    starts = [x[1] for x in result]
-    ends = [x[2] for x in result]
-    gene_names = [x[3] for x in result]
-    directions = [x[4] for x in result]
+    with instrument.stage("sort", total=len(chrs)):
+        # sort inputs by starts
+        result = sorted(zip(chrs, starts, ends, gene_names, directions), key=lambda tup:tup[1])
+        # unpack the sorted input
+        chrs = [x[0] for x in result]
+        starts = [x[1] for x in result]
+        ends = [x[2] for x in result]
+        gene_names = [x[3] for x in result]
+        directions = [x[4] for x in result]
+    # same strand only or both strands
+    find_closest = find_closest_one_direction if direction == 1 else find_closest_two_direction
     dists = [] # upstream distances - how much to go
-    if direction == 1:
+    with instrument.stage("compute", total=len(chrs)):
         for i in range(0, len(chrs)):
-            if i+1 % 2000 == 0:
-                print("%d done!" % i)
+            # report every now and then, every gene would be too often
+            if (i+1) % 2000 == 0:
+                instrument.progress(i+1)
             if gene_direction == "both":
-                dists.append(find_closest_one_direction(starts, ends, directions, bp_limit, i, "5"))
-                dists.append(find_closest_one_direction(starts, ends, directions, bp_limit, i, "3"))
+                dists.append(find_closest(starts, ends, directions, bp_limit, i, "5"))
+                dists.append(find_closest(starts, ends, directions, bp_limit, i, "3"))
             else:
-                dists.append(find_closest_one_direction(starts, ends, directions, bp_limit, i, gene_direction))
-            
-    else:
-        for i in range(0, len(chrs)):
-            if i+1 % 2000 == 0:
-                print("%d done!" % i)
-            if gene_direction == "both":
-                dists.append(find_closest_two_direction(starts, ends, directions, bp_limit, i, "5"))
-                dists.append(find_closest_two_direction(starts, ends, directions, bp_limit, i, "3"))
-            else:
-                dists.append(find_closest_two_direction(starts, ends, directions, bp_limit, i, gene_direction))
-    write_outputs(output_filename, chrs, starts, ends, gene_names, directions, dists, gene_direction)
+                dists.append(find_closest(starts, ends, directions, bp_limit, i, gene_direction))
+    # collect the flanks while writing if they are to be merged or counted
+    flanks = {} if merged_filename is not None or stats_filename is not None else None
+    write_outputs(output_filename, chrs, starts, ends, gene_names, directions, dists, gene_direction, instrument,
+                  flanks, chr_sizes)
+    if flanks is not None:
+        write_summaries(flanks, bp_limit, merged_filename, stats_filename, instrument)
+
+def pop_option(name):
+    """removes --name=value from the arguments and returns value (or None)"""
+    for arg in sys.argv[1:]:
+        if arg.startswith("--"+name+"="):
+            sys.argv.remove(arg)
+            return arg[len(name)+3:]
+    return None
 
 def check_parameters_and_dispatch():
     """check user inputs and supply the arguments properly"""
+    # take out --progress/--profile/--summary before counting arguments
+    try:
+        instrument = Instrument.from_argv("flank_genesregions_by_X_bases", sys.argv)
+    except ValueError as e:
+        print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION+str(e)+"\n")
+    # and the optional extra outputs
+    options = {"merged_filename": pop_option("merged"), "stats_filename": pop_option("stats"),
+               "genome": pop_option("genome")}
     # if incorrect number of parameters, quit
     if len(sys.argv) != 5 and len(sys.argv) != 6:
         print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION)
@@ -197,12 +384,14 @@ def check_parameters_and_dispatch():
         elif sys.argv[4] != "3" and sys.argv[4] != "5" and sys.argv[4] != "both":
             print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION+"Stream direction must be 5 or 3 or both!\n")
         else:
-            read_input_and_dispatch(sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4], int(sys.argv[5]))
+            instrument.run(read_input_and_dispatch, sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4],
+                           int(sys.argv[5]), instrument, **options)
     # if no optional direction, supply "1" as default
     else:
         if sys.argv[4] != "3" and sys.argv[4] != "5" and sys.argv[4] != "both":
             print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION+"Stream direction must be 5 or 3 or both!\n")
         else:
-            read_input_and_dispatch(sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4], 1)
+            instrument.run(read_input_and_dispatch, sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4],
+                           1, instrument, **options)
 
 check_parameters_and_dispatch()
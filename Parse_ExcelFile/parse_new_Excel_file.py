@@ -4,6 +4,11 @@
 import sys, os.path
 import pyexcel as pe
 
+# the shared barc package lives at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from barc import fastio
+from barc.instrument import Instrument, INSTRUMENT_USAGE
+
 PROGRAM_DESCRIPTION = """
 Takes an excel file name and an optional delimiter
  (default is tab) in command line argument and
@@ -13,7 +18,7 @@ USAGE_DESCRIPTION = """
 Usage: python %s <file_name> [delimiter="\\t"]
 Example: python %s foo.xls ","
 Note: both .xls and .xlsx can be used
-""" % (sys.argv[0], sys.argv[0])
+""" % (sys.argv[0], sys.argv[0]) + INSTRUMENT_USAGE
 
 def print_and_exit(message):
     print(message, file=sys.stderr)
@@ -27,27 +32,17 @@ def remove_extension(fname):
 
 def write_txt(sheet, d, fname):
     """Export the sheet into a tab-separated txt file"""
-    f = open(sheet.name + "_" + fname + ".txt", "w")
-    i = 1
-    for row in sheet:
-        j = 1
-        for value in row:
-            f.write(str(value))
-            # write delimiter unless it's the end
-            if j != len(row):
-                f.write(d)
-            j = j+1
-        # write newline unless it's the end
-        if i != sheet.number_of_rows():
-            f.write("\n")
-        i = i+1
-    f.close()
+    with fastio.open_output(sheet.name + "_" + fname + ".txt", text=True) as f:
+        # join each row with the delimiter and the rows with newlines,
+        # no newline after the last row
+        f.write("\n".join(d.join(str(value) for value in row) for row in sheet))
     
 
 def read_excel_file(fname, d):
     """Read an entire excel file and output each sheet as a txt file"""
     try:
-        book = pe.get_book(file_name=fname)
+        with instrument.stage("read"):
+            book = pe.get_book(file_name=fname)
     except pe.exceptions.FileTypeNotSupported:
         print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION+
                        "\nInput file must be of excel extension!\n")
@@ -55,9 +50,18 @@ def read_excel_file(fname, d):
         print_and_exit("\nInput file corrupt!\n")
     for name in book.sheet_names():
         print("Printing sheet %s" % name)
-        write_txt(book.sheet_by_name(name), d, remove_extension(fname))
+        sheet = book.sheet_by_name(name)
+        with instrument.stage("write"):
+            write_txt(sheet, d, remove_extension(fname))
+        instrument.count(sheet.number_of_rows())
         
 
+# take out --progress/--profile/--summary before counting arguments
+try:
+    instrument = Instrument.from_argv("parse_new_Excel_file", sys.argv)
+except ValueError as e:
+    print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION+str(e))
+
 # check if filename given
 if len(sys.argv) != 2 and len(sys.argv) != 3:
     print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION)
@@ -72,5 +76,5 @@ if not os.path.isfile(sys.argv[1]):
     print_and_exit("%s does not exist" % sys.argv[1])
 
 print("Reading %s" % sys.argv[1])
-read_excel_file(sys.argv[1], delimiter)
+instrument.run(read_excel_file, sys.argv[1], delimiter)
 print("Success!")
@@ -4,6 +4,11 @@
 import sys, os.path
 import pyexcel as pe
 
+# the shared barc package lives at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from barc import fastio
+from barc.instrument import Instrument, INSTRUMENT_USAGE
+
 # Note: need to install pyexcel and pyexcel-xls and pyexcel-xlsx
 # https://github.com/pyexcel/pyexcel
 # https://github.com/pyexcel/pyexcel-xls
@@ -23,7 +28,7 @@ Note: enclose delimiter by double quotes if it contains special
  characters or space
  output_name MUST be an excel file extension
  both .xls and .xlsx can be used
-""" % (sys.argv[0], sys.argv[0])
+""" % (sys.argv[0], sys.argv[0]) + INSTRUMENT_USAGE
 
 def remove_extension(fname):
     """Returns the filename with extension stripped"""
@@ -40,16 +45,17 @@ def make_content(file_name, delimiter):
     """Return a 2D array representing the page"""
     content = []
     try:
-        with open(file_name, "r") as f:
-            for line in f:
-                # strip away newline symbol
-                newline_stripped = line
-                if (line[-1] == "\n"):
-                    newline_stripped = line[:-1]
-                # append the array bt separating the line with the delimiter
-                content.append(newline_stripped.split(delimiter))
+        with fastio.open_input(file_name) as f:
+            # read block by block, the lines come already split
+            for batch in fastio.read_fields(f, delimiter.encode(), skip_empty=False,
+                                            progress=instrument.progress):
+                instrument.count(len(batch))
+                for fields in batch:
+                    content.append([field.decode() for field in fields])
     except IOError:
         print_and_exit("%s cannot be opened" % file_name)
+    except UnicodeDecodeError:
+        print_and_exit("%s is not UTF-8 text" % file_name)
     return content
 
 def write_excel(inputs, output_name, delimiter):
@@ -58,15 +64,23 @@ def write_excel(inputs, output_name, delimiter):
     # for each file, make a separate page
     for input_name in inputs:
         print("Reading from %s" % input_name)
-        book_content[remove_extension(input_name)] = make_content(input_name, delimiter)
+        with instrument.stage("read", total=os.path.getsize(input_name) if os.path.isfile(input_name) else None):
+            book_content[remove_extension(input_name)] = make_content(input_name, delimiter)
 
     # create book object and save the file
     try:
-        book = pe.Book(book_content)
-        book.save_as(output_name)
+        with instrument.stage("write"):
+            book = pe.Book(book_content)
+            book.save_as(output_name)
     except:
         print_and_exit("Cannot create EXCEL file! Invalid extension in %s" % output_name)
 
+# take out --progress/--profile/--summary before counting arguments
+try:
+    instrument = Instrument.from_argv("txt_to_Excel", sys.argv)
+except ValueError as e:
+    print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION+str(e))
+
 # check minimum arguments
 if len(sys.argv) < 4:
     print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION)
@@ -76,4 +90,4 @@ delimiter = bytes(sys.argv[-1], "utf-8").decode("unicode_escape")
 output_name = sys.argv[1]
 input_names = sys.argv[2:-1]
 
-write_excel(input_names, output_name, delimiter)
+instrument.run(write_excel, input_names, output_name, delimiter)
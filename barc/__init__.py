@@ -0,0 +1,7 @@
+# Shared helpers for the BaRC scripts
+# Scripts put the repository root on sys.path and import from here, e.g.
+#   from barc import fastio
+
+from barc.fastio import (open_input, open_output, input_size, read_chunks, read_lines,
+                         read_fields, write_lines)
+from barc.instrument import Instrument, INSTRUMENT_USAGE
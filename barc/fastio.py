@@ -0,0 +1,131 @@
+# Shared fast delimited-text I/O for the BaRC scripts
+
+import gzip
+import io
+import os
+import stat
+import sys
+
+# read and write in large blocks instead of line by line
+CHUNK_SIZE = 4 * 1024 * 1024
+BUFFER_SIZE = 4 * 1024 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+GZIP_LEVEL = 6
+
+
+def open_input(file_name):
+    """opens a file (or "-" for stdin) for binary reading,
+    transparently decompressing gzipped input"""
+    if file_name == "-":
+        raw = sys.stdin.buffer
+    else:
+        raw = open(file_name, "rb", buffering=BUFFER_SIZE)
+    # sniff the magic bytes rather than trusting the extension
+    if raw.peek(2)[:2] == GZIP_MAGIC:
+        if file_name == "-":
+            return gzip.GzipFile(fileobj=raw, mode="rb")
+        # GzipFile only closes the files it opened itself
+        raw.close()
+        return gzip.open(file_name, "rb")
+    return raw
+
+
+def open_output(file_name, text=False, encoding="utf-8"):
+    """opens a file (or "-" for stdout) for writing through a large buffer,
+    gzipping the output if the file name ends with .gz"""
+    if file_name == "-":
+        raw = io.BufferedWriter(io.FileIO(sys.stdout.fileno(), "wb", closefd=False),
+                                buffer_size=BUFFER_SIZE)
+    elif file_name.endswith(".gz"):
+        # opened by name so closing it also closes the file underneath
+        raw = io.BufferedWriter(gzip.open(file_name, "wb", compresslevel=GZIP_LEVEL),
+                                buffer_size=BUFFER_SIZE)
+    else:
+        raw = open(file_name, "wb", buffering=BUFFER_SIZE)
+    if text:
+        return io.TextIOWrapper(raw, encoding=encoding, newline="\n")
+    return raw
+
+
+def input_position(f):
+    """returns how many bytes of the underlying (compressed) file
+    have been consumed, or None if that cannot be told"""
+    try:
+        if isinstance(f, gzip.GzipFile):
+            return f.fileobj.tell()
+        return f.tell()
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def input_size(f):
+    """returns the size of the (compressed) file behind f, or None
+    for pipes and terminals"""
+    try:
+        raw = f.fileobj if isinstance(f, gzip.GzipFile) else f
+        st = os.fstat(raw.fileno())
+    except (OSError, ValueError, AttributeError, io.UnsupportedOperation):
+        return None
+    return st.st_size if stat.S_ISREG(st.st_mode) else None
+
+
+def read_chunks(f, chunk_size=CHUNK_SIZE, progress=None):
+    """yields blocks of bytes from f, each one ending on a line boundary;
+    progress, if given, is called with the number of bytes consumed so far"""
+    leftover = b""
+    consumed = 0
+    while True:
+        block = f.read(chunk_size)
+        if not block:
+            break
+        if progress is not None:
+            consumed += len(block)
+            position = input_position(f)
+            progress(consumed if position is None else position)
+        cut = block.rfind(b"\n")
+        # no full line in this block, keep reading
+        if cut == -1:
+            leftover = leftover + block
+            continue
+        yield leftover + block[:cut+1]
+        leftover = block[cut+1:]
+    # last line without a newline
+    if leftover:
+        yield leftover + b"\n"
+
+
+def read_lines(f, chunk_size=CHUNK_SIZE, progress=None):
+    """yields batches of lines (without newlines) from f; Windows line
+    endings are read like Unix ones"""
+    for chunk in read_chunks(f, chunk_size, progress):
+        # chunks end on a \n so a \r\n is never split between two of them
+        if b"\r" in chunk:
+            chunk = chunk.replace(b"\r\n", b"\n")
+        # the chunk always ends with a newline so the last item is empty
+        lines = chunk.split(b"\n")
+        lines.pop()
+        yield lines
+
+
+def read_fields(f, delimiter=b"\t", columns=None, chunk_size=CHUNK_SIZE, skip_empty=True,
+                progress=None):
+    """yields batches of split lines from f; if columns (0-indexed) is given,
+    only those fields are kept, in that order. Raises IndexError if a line
+    does not have one of the columns"""
+    for lines in read_lines(f, chunk_size, progress):
+        if skip_empty:
+            lines = [line for line in lines if line]
+        if columns is None:
+            yield [line.split(delimiter) for line in lines]
+        else:
+            # only split as far as the last column we need
+            last = max(columns)
+            yield [[fields[c] for c in columns]
+                   for fields in (line.split(delimiter, last+1) for line in lines)]
+
+
+def write_lines(output, lines):
+    """writes a batch of lines (bytes, without newlines) to output"""
+    if lines:
+        output.write(b"\n".join(lines))
+        output.write(b"\n")
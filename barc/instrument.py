@@ -0,0 +1,217 @@
+# Shared timing, progress and profiling hooks for the BaRC scripts
+
+import cProfile
+import collections
+import contextlib
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+
+INSTRUMENT_USAGE = """
+Instrumentation flags:
+ --progress           report progress with records/s and ETA to stderr
+ --profile[=sample]   profile the run with cProfile (default) or a sampling
+                      profiler, write <tool>.prof / <tool>.folded and print the
+                      hottest functions to stderr
+ --summary[=FILE]     write a JSON summary of the run to FILE (default stderr)
+"""
+# seconds between two progress reports
+PROGRESS_INTERVAL = 5.0
+# seconds between two samples of the sampling profiler
+SAMPLE_INTERVAL = 0.005
+# number of functions/stacks printed after profiling
+PROFILE_TOP = 20
+
+
+def pop_flags(argv):
+    """removes the instrumentation flags from argv (in place) so the
+    script can parse its own arguments, returns them as a dict"""
+    flags = {"progress": False, "profile": None, "summary": None}
+    for arg in list(argv[1:]):
+        name, _, value = arg.partition("=")
+        if name == "--progress" and not value:
+            flags["progress"] = True
+        elif name == "--profile":
+            flags["profile"] = value or "cprofile"
+        elif name == "--summary":
+            flags["summary"] = value or "-"
+        else:
+            continue
+        argv.remove(arg)
+    if flags["profile"] not in (None, "cprofile", "sample"):
+        raise ValueError("--profile must be cprofile or sample")
+    # progress and profiling runs always get a summary
+    if flags["summary"] is None and (flags["progress"] or flags["profile"]):
+        flags["summary"] = "-"
+    return flags
+
+
+def format_seconds(seconds):
+    """h:mm:ss"""
+    seconds = int(seconds)
+    return "%d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+class Sampler:
+    """a tiny sampling profiler: a thread records the main thread's stack
+    every SAMPLE_INTERVAL seconds, stacks are kept in collapsed form"""
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._target = threading.main_thread().ident
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append("%s (%s:%d)" % (code.co_name, os.path.basename(code.co_filename),
+                                             code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def enable(self):
+        self._thread.start()
+
+    def disable(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, file_name):
+        """writes the stacks in the collapsed format flamegraph.pl reads"""
+        with open(file_name, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write("%s %d\n" % (stack, count))
+
+    def print_top(self, out, top=PROFILE_TOP):
+        """prints the functions seen most often on top of the stack"""
+        total = sum(self.stacks.values()) or 1
+        leaves = collections.Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        for leaf, count in leaves.most_common(top):
+            print("%6.1f%%  %s" % (100.0 * count / total, leaf), file=out)
+
+
+class Instrument:
+    """per-stage timers, periodic progress and optional profiling of one run"""
+    def __init__(self, tool, progress=False, profile=None, summary=None, interval=PROGRESS_INTERVAL):
+        self.tool = tool
+        self.show_progress = progress
+        self.profile = profile
+        self.summary = summary
+        self.interval = interval
+        self.stages = collections.OrderedDict()
+        self.records = 0
+        self.extra = {}
+        self._start = time.perf_counter()
+        self._stage = None
+
+    @classmethod
+    def from_argv(cls, tool, argv):
+        """builds an Instrument from (and strips) the flags in argv"""
+        return cls(tool, **pop_flags(argv))
+
+    @contextlib.contextmanager
+    def stage(self, name, total=None):
+        """times a stage; total is the amount of work (bytes or records)
+        progress() is measured against for the ETA"""
+        self._stage = {"name": name, "total": total, "done": 0, "records": 0,
+                       "start": time.perf_counter(), "last_report": time.perf_counter()}
+        try:
+            yield self
+        finally:
+            stage, self._stage = self._stage, None
+            seconds = time.perf_counter() - stage["start"]
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+            if self.show_progress:
+                message = "%s: %s done in %s" % (self.tool, name, format_seconds(seconds))
+                if stage["records"]:
+                    message += ", %d records" % stage["records"]
+                print(message, file=sys.stderr)
+
+    def count(self, records):
+        """adds records processed in the current stage"""
+        self.records += records
+        if self._stage is not None:
+            self._stage["records"] += records
+
+    def progress(self, done):
+        """records how much of the stage's total is done and reports
+        to stderr every interval seconds"""
+        stage = self._stage
+        if stage is None or not self.show_progress:
+            return
+        stage["done"] = done
+        now = time.perf_counter()
+        if now - stage["last_report"] < self.interval:
+            return
+        stage["last_report"] = now
+        elapsed = now - stage["start"]
+        # a stage that counts no records of its own is measured by done
+        records = stage["records"] or done
+        message = "%s: %s %d records, %.0f records/s" % (self.tool, stage["name"], records,
+                                                         records / elapsed)
+        if stage["total"] and done:
+            fraction = min(done / stage["total"], 1.0)
+            message += ", %.1f%%, ETA %s" % (100 * fraction, format_seconds(elapsed / fraction - elapsed))
+        print(message, file=sys.stderr)
+
+    def write_summary(self, argv=None):
+        """writes the JSON summary of the run"""
+        if self.summary is None:
+            return
+        seconds = time.perf_counter() - self._start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        summary = {"tool": self.tool, "argv": argv if argv is not None else sys.argv[1:],
+                   "seconds": round(seconds, 4),
+                   "stages": dict((name, round(s, 4)) for name, s in self.stages.items()),
+                   "records": self.records,
+                   "records_per_s": round(self.records / seconds, 1) if seconds else None,
+                   # ru_maxrss is in KB on Linux and in bytes on macOS
+                   "peak_rss_kb": peak // 1024 if sys.platform == "darwin" else peak}
+        summary.update(self.extra)
+        if self.summary == "-":
+            print(json.dumps(summary), file=sys.stderr)
+        else:
+            with open(self.summary, "w") as f:
+                json.dump(summary, f, indent=1)
+                f.write("\n")
+
+    def run(self, main, *args, **kwargs):
+        """runs main(*args, **kwargs) under the requested profiler and writes the
+        summary afterwards, even if main exits early"""
+        if self.profile == "cprofile":
+            profiler = cProfile.Profile()
+        elif self.profile == "sample":
+            profiler = Sampler()
+        else:
+            profiler = None
+        if profiler is not None:
+            profiler.enable()
+        try:
+            return main(*args, **kwargs)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self._dump_profile(profiler)
+            self.write_summary()
+
+    def _dump_profile(self, profiler):
+        if isinstance(profiler, Sampler):
+            file_name = self.tool + ".folded"
+            profiler.dump(file_name)
+            profiler.print_top(sys.stderr)
+        else:
+            file_name = self.tool + ".prof"
+            profiler.dump_stats(file_name)
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        self.extra["profile"] = file_name
@@ -0,0 +1,8 @@
+./run_benchmarks.py --scale small
+./run_benchmarks.py --scale small medium large --tools flank fastq --repeat 3
+./generate_inputs.py bed medium sample_input.bed
+
+# generated inputs are kept in data/ and reused by later runs
+# every run is appended to history.jsonl and compared with the last run
+# of the same tool, engine and scale; a slowdown over 10% is reported as
+# a REGRESSION and makes run_benchmarks.py exit with status 1
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# Synthetic genomics inputs for benchmarking the BaRC scripts
+
+import os, sys
+import random
+
+PROGRAM_DESCRIPTION = """
+Generates synthetic inputs resembling the real data the scripts
+ are run on: BED annotations with overlapping genes, WI Illumina
+ fastq files with /1;0 suffixes, wide groupBy tables, tab-separated
+ sheets for a multi-sheet workbook, and a fake /nfs/genomes tree
+"""
+USAGE_DESCRIPTION = """
+Usage: %s <kind> <scale> <output>
+ kind: %s
+ scale: %s
+Example: %s bed small sample.bed
+""" % (sys.argv[0], ", ".join(["bed", "fastq", "groupby", "sheets", "genomes"]),
+       ", ".join(["small", "medium", "large", "huge"]), sys.argv[0])
+
+# sizes of every kind of input at each scale
+SCALES = {
+    # number of intervals
+    "bed": {"small": 10000, "medium": 100000, "large": 1000000, "huge": 10000000},
+    # bytes of fastq
+    "fastq": {"small": 2**20, "medium": 100 * 2**20, "large": 2**30, "huge": 10 * 2**30},
+    # number of rows of the groupBy table
+    "groupby": {"small": 10000, "medium": 100000, "large": 1000000, "huge": 10000000},
+    # rows per sheet
+    "sheets": {"small": 1000, "medium": 10000, "large": 100000, "huge": 1000000},
+    # number of genome folders
+    "genomes": {"small": 20, "medium": 100, "large": 500, "huge": 2000},
+}
+SEED = 2018
+
+CHROMS = ["chr%d" % i for i in range(1, 23)] + ["chrX", "chrY"]
+SHEET_COUNT = 4
+GROUPBY_COLUMNS = 20
+FASTQ_READ_LENGTH = 50
+FASTQ_POOL_SIZE = 1000
+
+
+def print_and_exit(message):
+    """prints the error message and exits"""
+    print(message, file=sys.stderr)
+    sys.exit(1)
+
+
+def write_bed(output_name, count, rng):
+    """writes count gene intervals in 12-column BED; genes come in
+    clusters so that neighbours overlap or sit closer than the flank limit"""
+    per_chrom = max(1, count // len(CHROMS))
+    written = 0
+    with open(output_name, "w") as output:
+        for chrom in CHROMS:
+            pos = rng.randint(10000, 50000)
+            n = per_chrom if chrom != CHROMS[-1] else count - written
+            for i in range(n):
+                # mostly short gaps (some negative, i.e. overlaps) and the occasional desert
+                if rng.random() < 0.1:
+                    pos += rng.randint(5000, 200000)
+                else:
+                    pos += rng.randint(-3000, 4000)
+                pos = max(pos, 0)
+                length = int(rng.lognormvariate(8, 1.2)) + 50
+                exons = rng.randint(1, 6)
+                sizes = ",".join(str(max(1, length // exons)) for _ in range(exons)) + ","
+                offsets = ",".join(str(j * (length // exons)) for j in range(exons)) + ","
+                output.write("%s\t%d\t%d\tgene%d.%d\t0\t%s\t%d\t%d\t0\t%d\t%s\t%s\n" % (
+                    chrom, pos, pos + length, written, i, rng.choice("+-"), pos, pos,
+                    exons, sizes, offsets))
+                written += 1
+    return written
+
+
+def write_fastq(output_name, size, rng):
+    """writes about size bytes of fastq with WI Illumina /1;0 and /2;0 suffixes"""
+    # draw from a pool of sequences so that huge files are quick to produce
+    seqs = ["".join(rng.choice("ACGTN" if rng.random() < 0.01 else "ACGT")
+                    for _ in range(FASTQ_READ_LENGTH)) for _ in range(FASTQ_POOL_SIZE)]
+    quals = ["".join(chr(33 + rng.randint(2, 40)) for _ in range(FASTQ_READ_LENGTH))
+             for _ in range(FASTQ_POOL_SIZE)]
+    written = 0
+    records = 0
+    with open(output_name, "w", buffering=2**22) as output:
+        while written < size:
+            batch = []
+            # stop at the record that reaches size, not at the end of a batch
+            for _ in range(10000):
+                name = "WIGTC-HISEQ:1:%d:%d:%d" % (1101 + records % 16, records % 20000, records)
+                mate = 1 + (records & 1)
+                k = rng.randrange(FASTQ_POOL_SIZE)
+                record = "@%s/%d;0\n%s\n+%s/%d;0\n%s\n" % (name, mate, seqs[k], name, mate, quals[k])
+                batch.append(record)
+                written += len(record)
+                records += 1
+                if written >= size:
+                    break
+            output.write("".join(batch))
+    return records
+
+
+def write_groupby(output_name, rows, rng):
+    """writes a wide table with a header, grouped on the first two columns"""
+    with open(output_name, "w") as output:
+        output.write("\t".join(["chrom", "gene"] + ["col%d" % i for i in range(3, GROUPBY_COLUMNS + 1)]) + "\n")
+        group = 0
+        for i in range(rows):
+            if rng.random() < 0.2:
+                group += 1
+            values = ["%.3f" % rng.gauss(100, 25) for _ in range(GROUPBY_COLUMNS - 2)]
+            output.write("%s\tgene%d\t%s\n" % (CHROMS[group % len(CHROMS)], group, "\t".join(values)))
+    return rows
+
+
+def write_sheets(output_dir, rows, rng):
+    """writes SHEET_COUNT tab-separated sheets to be packed into one workbook"""
+    os.makedirs(output_dir, exist_ok=True)
+    for s in range(1, SHEET_COUNT + 1):
+        with open(os.path.join(output_dir, "Sheet%d.txt" % s), "w") as output:
+            output.write("id\tname\tscore\tcount\n")
+            for i in range(rows):
+                output.write("%d\tgene%d\t%.4f\t%d\n" % (i, rng.randrange(rows), rng.random(), rng.randrange(1000)))
+    return rows * SHEET_COUNT
+
+
+def write_genomes(output_dir, count, rng):
+    """writes a fake /nfs/genomes tree with aliases and index folders"""
+    # same list as GenomeInfo.folder_names in nfs_genome_html.py
+    folder_names = ["anno", "bed", "blast", "blat", "bowtie", "bwa", "fasta",
+                    "fasta_whole_genome", "gff", "gtf", "hisat", "igv", "liftOver", "maf", "rsem",
+                    "snp", "STAR", "10x"]
+    species = [("Homo sapiens", "Human"), ("Mus musculus", "Mouse"), ("Danio rerio", "Zebrafish"),
+               ("Drosophila melanogaster", "Fruit fly"), ("Saccharomyces cerevisiae", "Yeast")]
+    for i in range(count):
+        # a few genomes live one level down, like S_cerevisiae_strains
+        if i % 10 == 9:
+            genome = os.path.join(output_dir, "S_cerevisiae_strains", "strain_%d" % i)
+        else:
+            genome = os.path.join(output_dir, "genome_%d" % i)
+        scientific, common = rng.choice(species)
+        os.makedirs(genome, exist_ok=True)
+        with open(os.path.join(genome, "GENOME_ALIASES"), "w") as alias:
+            alias.write("%s\n%s\nasm%d\nrelease %d\n" % (scientific, common, i, rng.randint(50, 100)))
+        for folder in folder_names:
+            if rng.random() < 0.6:
+                path = os.path.join(genome, folder)
+                os.makedirs(path, exist_ok=True)
+                # most index folders are populated, some are left empty
+                if rng.random() < 0.9:
+                    for chrom in CHROMS[:rng.randint(1, 5)]:
+                        open(os.path.join(path, chrom + ".idx"), "w").close()
+    # folders the script is told to skip
+    for skipped in ["lost+found", ".snapshot", "TO_DELETE"]:
+        os.makedirs(os.path.join(output_dir, skipped), exist_ok=True)
+    return count
+
+
+GENERATORS = {
+    "bed": write_bed,
+    "fastq": write_fastq,
+    "groupby": write_groupby,
+    "sheets": write_sheets,
+    "genomes": write_genomes,
+}
+
+
+def generate(kind, scale, output_name, seed=SEED):
+    """generates one input of the given kind and scale, returns the number of records"""
+    if kind not in GENERATORS:
+        raise ValueError("Unknown input kind %s" % kind)
+    if scale not in SCALES[kind]:
+        raise ValueError("Unknown scale %s" % scale)
+    return GENERATORS[kind](output_name, SCALES[kind][scale], random.Random(seed))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION)
+    try:
+        print("%d records written" % generate(sys.argv[1], sys.argv[2], sys.argv[3]))
+    except ValueError as e:
+        print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION+"\n"+str(e))
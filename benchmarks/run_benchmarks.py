@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# Benchmark harness for the BaRC scripts
+
+import os, sys
+import argparse
+import datetime
+import importlib.util
+import json
+import platform
+import shutil
+import subprocess
+import time
+
+import generate_inputs
+
+PROGRAM_DESCRIPTION = """
+Times every script on synthetic inputs (see generate_inputs.py)
+ and appends throughput and peak memory of each run to a JSON lines
+ history, so regressions and speedups can be checked against earlier runs
+"""
+USAGE_DESCRIPTION = """
+Example: %s --scale small medium --tools flank fastq
+""" % sys.argv[0]
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+HISTORY_FILE_NAME = os.path.join(BENCH_DIR, "history.jsonl")
+# a run this much slower than the last recorded one is reported
+REGRESSION_THRESHOLD = 0.10
+
+# a pure Python line-by-line copy: the floor every engine is measured against
+BASELINE_COPY = ("import sys\n"
+                 "with open(sys.argv[1]) as i, open(sys.argv[2], 'w') as o:\n"
+                 "    for line in i:\n"
+                 "        o.write(line)\n")
+
+
+def script(*path):
+    """path to a script in the repository"""
+    return os.path.join(REPO_DIR, *path)
+
+
+class Engine:
+    """one way of running a tool: argv, stdin/stdout redirection and
+    what it needs installed to run at all"""
+    def __init__(self, name, argv, stdin=None, stdout=None, cwd=None,
+                 modules=(), executables=()):
+        self.name = name
+        self.argv = argv
+        self.stdin = stdin
+        self.stdout = stdout
+        self.cwd = cwd
+        self.modules = modules
+        self.executables = executables
+
+    def missing(self):
+        """returns the list of requirements that are not available"""
+        missing = [m for m in self.modules if importlib.util.find_spec(m) is None]
+        return missing + [e for e in self.executables if shutil.which(e) is None]
+
+
+# each tool maps to the kind of input it consumes and a function building its
+# engines from (input path, output path); new engines are added to these lists
+def flank_engines(inp, out):
+    """the flank tool on both flanks, same strand and both strands"""
+    flank = script("Flank_genesregions_by_X_bases", "flank_genesregions_by_X_bases.py")
+    return [Engine("baseline", [sys.executable, "-c", BASELINE_COPY, inp, out]),
+            Engine("same_strand", [sys.executable, flank, inp, out, "2000", "both", "1"]),
+            Engine("both_strands", [sys.executable, flank, inp, out, "2000", "both", "2"])]
+
+def fastq_engines(inp, out):
+    """the WI Illumina suffix remover reading stdin, with and without QC statistics"""
+    tool = script("rm_WI_Illumina_suffix", "rm_WI_Illumina_suffix.STDIN.py")
+    return [Engine("baseline", [sys.executable, "-c", BASELINE_COPY, inp, out]),
+            Engine("current", [sys.executable, tool], stdin=inp, stdout=out),
+            Engine("qc", [sys.executable, tool, "--qc=" + out + ".qc.json"], stdin=inp, stdout=out)]
+
+def groupby_engines(inp, out):
+    """both groupBy wrappers on the same columns"""
+    args = ["-i", inp, "-g", "1,2", "-c", "3-10,11-20", "-o", "mean,max"]
+    cwd = os.path.dirname(out)
+    return [Engine("baseline", [sys.executable, "-c", BASELINE_COPY, inp, out]),
+            Engine("groupBy", [sys.executable, script("groupBy", "groupBy.py")] + args,
+                   stdout=out, cwd=cwd, executables=["groupBy"]),
+            Engine("groupBy_header", [sys.executable, script("groupBy", "groupBy_header.py")] + args,
+                   stdout=out, cwd=cwd, executables=["groupBy"])]
+
+def sheets_engines(inp, out):
+    """packs the sheets into a workbook and splits it back"""
+    sheets = [os.path.join(inp, "Sheet%d.txt" % s) for s in range(1, generate_inputs.SHEET_COUNT + 1)]
+    # parse_new_Excel_file writes its sheets to the current directory
+    return [Engine("txt_to_Excel", [sys.executable, script("Parse_ExcelFile", "txt_to_Excel.py"), out + ".xls"]
+                   + sheets + ["\\t"], modules=["pyexcel"]),
+            Engine("parse_new_Excel_file", [sys.executable, script("Parse_ExcelFile", "parse_new_Excel_file.py"),
+                                            out + ".xls"], cwd=os.path.dirname(out), modules=["pyexcel"])]
+
+def genomes_engines(inp, out):
+    """the genome availability page and spreadsheet"""
+    # the script reads its html templates from its own folder
+    return [Engine("current", [sys.executable, script("nfs_genomes_html", "nfs_genome_html.py"), inp, out],
+                   cwd=script("nfs_genomes_html"), modules=["pyexcel"])]
+
+TOOLS = {
+    "flank": ("bed", flank_engines),
+    "fastq": ("fastq", fastq_engines),
+    "groupby": ("groupby", groupby_engines),
+    "excel": ("sheets", sheets_engines),
+    "genomes": ("genomes", genomes_engines),
+}
+
+
+def input_bytes(path):
+    """total size of a file or of everything under a folder"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for file_ in files:
+            total += os.path.getsize(os.path.join(root, file_))
+    return total
+
+
+def prepare_input(kind, scale, data_dir):
+    """generates the input once and reuses it on later runs"""
+    path = os.path.join(data_dir, "%s_%s" % (kind, scale))
+    marker = path + ".records"
+    if not os.path.exists(marker):
+        print("Generating %s input at scale %s" % (kind, scale), file=sys.stderr)
+        records = generate_inputs.generate(kind, scale, path)
+        with open(marker, "w") as f:
+            f.write(str(records))
+    with open(marker) as f:
+        return path, int(f.read())
+
+
+def run_engine(engine):
+    """runs one engine, returns (seconds, peak RSS in KB, return code)"""
+    stdin = open(engine.stdin, "rb") if engine.stdin else subprocess.DEVNULL
+    stdout = open(engine.stdout, "wb") if engine.stdout else subprocess.DEVNULL
+    try:
+        start = time.perf_counter()
+        proc = subprocess.Popen(engine.argv, stdin=stdin, stdout=stdout,
+                                stderr=subprocess.DEVNULL, cwd=engine.cwd)
+        # wait4 gives the resource usage of this child alone
+        _, status, usage = os.wait4(proc.pid, 0)
+        seconds = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    finally:
+        for f in (stdin, stdout):
+            if f is not subprocess.DEVNULL:
+                f.close()
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    peak = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    return seconds, peak, proc.returncode
+
+
+def git_commit():
+    """current commit of the repository, if it can be told"""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                       stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(history_file_name):
+    """reads every earlier run from the history file"""
+    if not os.path.exists(history_file_name):
+        return []
+    with open(history_file_name) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def last_run(history, record):
+    """the most recent successful run of the same tool, engine and scale"""
+    for old in reversed(history):
+        if (old["tool"], old["engine"], old["scale"]) == (record["tool"], record["engine"], record["scale"]) \
+           and old["returncode"] == 0:
+            return old
+    return None
+
+
+def benchmark(tools, scales, data_dir, history_file_name, repeat):
+    """runs every engine of every tool at every scale and records the results"""
+    os.makedirs(data_dir, exist_ok=True)
+    history = load_history(history_file_name)
+    common = {"date": datetime.datetime.now().isoformat(timespec="seconds"),
+              "commit": git_commit(), "host": platform.node(),
+              "python": platform.python_version()}
+    regressions = 0
+    with open(history_file_name, "a") as history_file:
+        for tool in tools:
+            kind, engines = TOOLS[tool]
+            for scale in scales:
+                inp, records = prepare_input(kind, scale, data_dir)
+                size = input_bytes(inp)
+                out = os.path.join(data_dir, "%s_%s.out" % (tool, scale))
+                for engine in engines(inp, out):
+                    missing = engine.missing()
+                    if missing:
+                        print("%-8s %-20s %-7s skipped, needs %s" % (tool, engine.name, scale, ", ".join(missing)))
+                        continue
+                    runs = [run_engine(engine) for _ in range(repeat)]
+                    failed = [run for run in runs if run[2] != 0]
+                    # any failing repeat is recorded, otherwise the fastest one
+                    seconds, peak, code = failed[0] if failed else min(runs)
+                    record = dict(common, tool=tool, engine=engine.name, scale=scale,
+                                  input_bytes=size, records=records, seconds=round(seconds, 4),
+                                  mb_per_s=round(size / seconds / 2**20, 3),
+                                  records_per_s=round(records / seconds, 1),
+                                  peak_rss_kb=peak, returncode=code)
+                    old = last_run(history, record)
+                    note = ""
+                    if code != 0:
+                        note = "FAILED (exit code %d)" % code
+                    elif old is not None:
+                        change = old["seconds"] / seconds - 1
+                        note = "%+.1f%% vs %s" % (100 * change, old["commit"] or old["date"])
+                        if change < -REGRESSION_THRESHOLD:
+                            note += "  REGRESSION"
+                            regressions += 1
+                    print("%-8s %-20s %-7s %9.3fs %10.2f MB/s %12.0f rec/s %9d KB  %s" % (
+                        tool, engine.name, scale, seconds, record["mb_per_s"],
+                        record["records_per_s"], peak, note))
+                    history_file.write(json.dumps(record) + "\n")
+                    history_file.flush()
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=PROGRAM_DESCRIPTION, epilog=USAGE_DESCRIPTION,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tools", nargs="+", choices=sorted(TOOLS), default=sorted(TOOLS))
+    parser.add_argument("--scale", nargs="+", choices=["small", "medium", "large", "huge"],
+                        default=["small"])
+    parser.add_argument("--data-dir", default=DATA_DIR,
+                        help="where generated inputs and outputs are kept (default: %(default)s)")
+    parser.add_argument("--history", default=HISTORY_FILE_NAME,
+                        help="JSON lines file the results are appended to (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per engine, the fastest is kept")
+    args = parser.parse_args()
+    sys.exit(1 if benchmark(args.tools, args.scale, args.data_dir, args.history, args.repeat) else 0)
@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
 # Written by Alex Ding, 2018
 
-import sys
+import os, sys
 import subprocess
 import datetime
 
+# the shared barc package lives at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from barc.instrument import Instrument, INSTRUMENT_USAGE
+
 PROGRAM_DESCRIPTION = """
 This is a wrapper for groupBy. Takes the same flags
  but allows for range specification (with "-") in -c and 
@@ -16,7 +20,7 @@ USAGE_DESCRIPTION = """
 Usage: see the following usage for groupBy and note that
  this wrapper supports range specifiers
 Example: ./groupBy.py -i sample_input.txt -g 1 -c 8-10,12,13-15 -o mean,collapse,median
-"""
+""" + INSTRUMENT_USAGE
 LOG_FILENAME = "input_groupBy.log"
 
 def print_and_exit(message):
@@ -34,9 +38,14 @@ def call_and_exit(args, out=sys.stdout):
             print("./groupBy " + " ".join(args)+"\n", file=sys.stderr)
     except IOError:
         print("Warning: log file non-existent", file=sys.stderr)
-    subprocess.call(["groupBy"] + args, stdout=out)
+    instrument.run(dispatch, args, out)
     exit()
 
+def dispatch(args, out):
+    """runs groupBy, timing it"""
+    with instrument.stage("groupBy"):
+        subprocess.call(["groupBy"] + args, stdout=out)
+
 def parse_flags(cols, ops):
     """takes in two arrays and parse the columns to replace them accordingly"""
 
@@ -76,6 +85,12 @@ def extend(args, col_id, ops_id):
     args[col_id], args[ops_id] = parse_flags(args[col_id].split(","), args[ops_id].split(","))
     return args
 
+# take out --progress/--profile/--summary, groupBy doesn't know them
+try:
+    instrument = Instrument.from_argv("groupBy", sys.argv)
+except ValueError as e:
+    print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION+str(e))
+
 columns_flag = None
 operations_flag = None
 
@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
 # Written by Alex Ding, 2018
 
-import sys
+import os, sys
 import subprocess
 import datetime
 
+# the shared barc package lives at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from barc import fastio
+from barc.instrument import Instrument, INSTRUMENT_USAGE
+
 PROGRAM_DESCRIPTION = """
 This is a wrapper for groupBy that assumes the existence of
  headers in the input and the user's desire to get headers in
@@ -20,7 +25,7 @@ USAGE_DESCRIPTION = """
 Usage: see the following usage for groupBy and note that
  this wrapper supports range specifiers
 Example: ./groupBy.py -i sample_input.txt -g 1 -c 8-10,12,13-15 -o mean,collapse,median
-"""
+""" + INSTRUMENT_USAGE
 LOG_FILENAME = "input_groupBy.log"
 
 def print_and_exit(message):
@@ -29,9 +34,10 @@ def print_and_exit(message):
     exit()
 
 def execute(cmd):
-    popen = subprocess.Popen(cmd, stdout=subprocess.PIPE, universal_newlines=True)
-    for stdout_line in iter(popen.stdout.readline, ""):
-        yield stdout_line 
+    """runs cmd and yields its output in blocks of whole lines"""
+    popen = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    for chunk in fastio.read_chunks(popen.stdout):
+        yield chunk
     popen.stdout.close()
     return_code = popen.wait()
     if return_code:
@@ -39,7 +45,7 @@ def execute(cmd):
 
 def first_line_handle(path, cols):
     """special handles the header of output"""
-    headers = path.split("\t")
+    headers = path.rstrip("\n").split("\t")
     output = []
     try:
         for col in cols:
@@ -60,18 +66,21 @@ def call_and_exit(args, actual_output=False, cols=[]):
     except IOError:
         print("Warning: log file non-existent", file=sys.stderr)
 
-    # if we're getting actual output, special handle the first line
-    if actual_output:
-        for i, path in enumerate(execute(["groupBy", "-header"] + args)):
-            if i == 0:
-                print(first_line_handle(path, cols))
-            else:
-                print(path, end="")
-    else:
-        for path in execute(["groupBy", "-header"]+args):
-            print(path, end="")
+    instrument.run(relay, args, actual_output, cols)
     exit()
 
+def relay(args, actual_output, cols):
+    """runs groupBy and passes its output through to stdout"""
+    with fastio.open_output("-") as output, instrument.stage("groupBy"):
+        for i, chunk in enumerate(execute(["groupBy", "-header"] + args)):
+            # if we're getting actual output, special handle the first line
+            if i == 0 and actual_output:
+                cut = chunk.find(b"\n") + 1
+                output.write((first_line_handle(chunk[:cut].decode(), cols) + "\n").encode())
+                chunk = chunk[cut:]
+            output.write(chunk)
+            instrument.count(chunk.count(b"\n"))
+
 def parse_flags(cols, ops):
     """takes in two arrays and parse the columns to replace them accordingly"""
 
@@ -114,6 +123,12 @@ def extend(args, col_id, ops_id):
     args[col_id], args[ops_id], cols = parse_flags(args[col_id].split(","), args[ops_id].split(","))
     return args, cols
 
+# take out --progress/--profile/--summary, groupBy doesn't know them
+try:
+    instrument = Instrument.from_argv("groupBy_header", sys.argv)
+except ValueError as e:
+    print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION+str(e))
+
 columns_flag = None
 operations_flag = None
 
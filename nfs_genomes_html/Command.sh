@@ -1 +1,10 @@
-./nfs_genome_html.py /nfs/genomes output
\ No newline at end of file
+./nfs_genome_html.py /nfs/genomes output
+./genome_service.py /nfs/genomes 8000 30
+./genome_inventory.py build /nfs/genomes
+./genome_inventory.py alias hg38 STAR
+./genome_inventory.py tool bowtie
+./genome_inventory.py species "Mus musculus"
+# for a genomes directory other than /nfs/genomes
+GENOME_INVENTORY=/tmp/genomes/genome_inventory.json ./nfs_genome_html.py /tmp/genomes output
+GENOME_INVENTORY=/tmp/genomes/genome_inventory.json ./genome_inventory.py alias hg38 STAR
+./genome_inventory.py -i /tmp/genomes/genome_inventory.json alias hg38 STAR
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# Persisted genome inventory and indexed lookups on it
+
+import os, sys
+
+from nfs_genome_html import (GenomeInfo, collect_genomes, read_inventory_file,
+                             write_inventory_file, default_inventory_file)
+
+PROGRAM_DESCRIPTION = """
+Answers questions about the genomes directory from the saved
+ inventory (written by nfs_genome_html.py, genome_service.py or the
+ build command below) without scanning the directory again
+"""
+USAGE_DESCRIPTION = """
+Usage: %s [-i inventory.json] <command> [arguments]
+ alias <alias> [tool]     directory backing an alias (or directory name);
+                          with a tool, the tool's folder, exits 1 if absent
+ tool <tool>              directories that have the tool
+ species <name>           directories of a species (scientific or common name)
+ build <directory>        scans directory and saves the inventory
+Inventory: -i, else $GENOME_INVENTORY, else /nfs/genomes/genome_inventory.json
+ (build saves to <directory>/genome_inventory.json if neither is given)
+Exit status: 0 if found, 1 if not, 2 on errors
+Example: %s alias mm9 bowtie
+""" % (sys.argv[0], sys.argv[0])
+
+DEFAULT_INVENTORY = default_inventory_file("/nfs/genomes")
+# exit status of usage errors and unreadable inventories; 1 means not found
+ERROR_STATUS = 2
+
+
+def print_and_exit(message):
+    """prints the error message and exits with ERROR_STATUS so callers
+    can tell errors from lookups that found nothing"""
+    print(message, file=sys.stderr)
+    sys.exit(ERROR_STATUS)
+
+
+class GenomeIndex:
+    """in-memory indexes over the inventory; lookups are case-insensitive"""
+    def __init__(self, gens, directory=""):
+        self.directory = directory
+        self.genomes = {}
+        # alias -> directories, tool -> directories, species -> directories
+        self.by_alias = {}
+        self.by_tool = dict((tool, set()) for tool in GenomeInfo.folder_names)
+        self.by_species = {}
+        for gen in gens:
+            self.genomes[gen.folder_name] = gen
+            # a genome can be asked for by its aliases or its own directory name
+            for alias in gen.assembly_aliases + [gen.folder_name, gen.folder_name.split("/")[-1]]:
+                folders = self.by_alias.setdefault(alias.lower(), [])
+                if gen.folder_name not in folders:
+                    folders.append(gen.folder_name)
+            for tool, present in gen.folders_presence.items():
+                if present:
+                    self.by_tool.setdefault(tool, set()).add(gen.folder_name)
+            for name in (gen.scientific_name, gen.common_name):
+                if name != "N/A":
+                    self.by_species.setdefault(name.lower(), set()).add(gen.folder_name)
+
+    @classmethod
+    def load(cls, file_name=DEFAULT_INVENTORY):
+        """builds the index from a saved inventory"""
+        directory, gens = read_inventory_file(file_name)
+        return cls(gens, directory)
+
+    def resolve(self, alias):
+        """returns the GenomeInfo backing alias; raises KeyError if no
+        genome has it and ValueError if several do"""
+        folders = self.by_alias.get(alias.lower())
+        if not folders:
+            raise KeyError("No genome has the alias %s" % alias)
+        if len(folders) > 1:
+            raise ValueError("Alias %s is ambiguous: %s" % (alias, ", ".join(folders)))
+        return self.genomes[folders[0]]
+
+    def has(self, alias, tool):
+        """whether the genome behind alias has a (non-empty) tool folder"""
+        return self.resolve(alias).folder_name in self.by_tool.get(tool, ())
+
+    def path(self, alias, tool=None):
+        """full path of the genome behind alias, or of its tool folder"""
+        path = os.path.join(self.directory, self.resolve(alias).folder_name)
+        return path if tool is None else os.path.join(path, tool)
+
+    def with_tool(self, tool):
+        """sorted directories that have the tool"""
+        return sorted(self.by_tool.get(tool, ()))
+
+    def species(self, name):
+        """sorted directories of a species, by scientific or common name"""
+        return sorted(self.by_species.get(name.lower(), ()))
+
+
+def query(index, command, args):
+    """runs one command line query, returns the exit status"""
+    if command == "alias" and len(args) in (1, 2):
+        try:
+            gen = index.resolve(args[0])
+        except (KeyError, ValueError) as e:
+            print(e.args[0], file=sys.stderr)
+            return 1
+        if len(args) == 2:
+            if not index.has(args[0], args[1]):
+                print("%s has no %s folder" % (gen.folder_name, args[1]), file=sys.stderr)
+                return 1
+            print(index.path(args[0], args[1]))
+        else:
+            print(index.path(args[0]))
+        return 0
+    elif command == "tool" and len(args) == 1:
+        folders = index.with_tool(args[0])
+    elif command == "species" and len(args) == 1:
+        folders = index.species(args[0])
+    else:
+        print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION)
+    for folder in folders:
+        gen = index.genomes[folder]
+        print("%s\t%s" % (os.path.join(index.directory, folder), ", ".join(gen.assembly_aliases) or "N/A"))
+    return 0 if folders else 1
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    inventory_file = None
+    if len(args) >= 2 and args[0] == "-i":
+        inventory_file = args[1]
+        args = args[2:]
+    if not args:
+        print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION)
+
+    if args[0] == "build":
+        if len(args) != 2:
+            print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION)
+        if inventory_file is None:
+            inventory_file = default_inventory_file(args[1])
+        try:
+            write_inventory_file(inventory_file, collect_genomes(args[1]), args[1])
+        except EnvironmentError as e:
+            print_and_exit(str(e))
+        sys.exit(0)
+
+    if inventory_file is None:
+        inventory_file = DEFAULT_INVENTORY
+    try:
+        index = GenomeIndex.load(inventory_file)
+    except (EnvironmentError, ValueError, KeyError):
+        print_and_exit("Cannot read the inventory %s, build it first" % inventory_file)
+    sys.exit(query(index, args[0], args[1:]))
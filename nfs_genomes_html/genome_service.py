@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# Long-running version of nfs_genome_html.py
+
+import os, sys
+import ctypes
+import select
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from nfs_genome_html import (GenomeInfo, list_genome_folders, generate_gene_info,
+                             html_content, excel_sheet, inventory_content,
+                             write_inventory_file, default_inventory_file, print_and_exit)
+
+PROGRAM_DESCRIPTION = """
+Keeps the genome availability table of a genomes directory in
+ memory and serves it as HTML, EXCEL and JSON over a local HTTP
+ endpoint. Only the genomes whose folders change are rescanned:
+ changes are picked up through inotify where the filesystem supports
+ it and by polling folder modification times (e.g. on NFS).
+ The inventory is saved on every change for genome_inventory.py, to
+ inventory_file (default: $GENOME_INVENTORY, else
+ <directory>/genome_inventory.json)
+"""
+USAGE_DESCRIPTION = """
+Usage: %s <directory> [port=8000] [poll_seconds=30] [inventory_file]
+Example: %s /nfs/genomes 8000 10
+Then: http://localhost:8000/ (also /genomes.xls and /genomes.json)
+""" % (sys.argv[0], sys.argv[0])
+
+HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+DEFAULT_POLL_SECONDS = 30
+EXCEL_FILE_NAME = "genomes.xls"
+JSON_FILE_NAME = "genomes.json"
+# wait this long after a notification for the rest of a burst of changes
+SETTLE_SECONDS = 0.2
+
+
+class GenomeInventory:
+    """the GenomeInfo of every genome under directory, kept in memory
+    and refreshed one genome at a time"""
+    def __init__(self, directory):
+        self.directory = directory
+        self.genomes = {}
+        self.signatures = {}
+        # bumped on every change, rendered reports are cached per version
+        self.version = 0
+        self.lock = threading.Lock()
+        self._reports = {}
+
+    def signature(self, folder):
+        """modification times of everything populate() looks at: the genome
+        folder, its alias file and the index folders in it"""
+        path = self.directory + "/" + folder
+        stamps = [os.stat(path).st_mtime_ns]
+        for name in [GenomeInfo.alias_file_name] + GenomeInfo.folder_names:
+            try:
+                stamps.append(os.stat(path + "/" + name).st_mtime_ns)
+            except OSError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def refresh(self, folders=None):
+        """rescans the given genome folders, or relists the directory and
+        checks every genome if folders is None; returns the folders that changed"""
+        if folders is None:
+            # genomes that failed to parse have a signature but no entry
+            folders = set(list_genome_folders(self.directory)) | set(self.signatures)
+        changed = set()
+        for folder in folders:
+            try:
+                sig = self.signature(folder)
+                if sig == self.signatures.get(folder):
+                    continue
+                gen = generate_gene_info(self.directory, folder)
+            except (OSError, StopIteration):
+                # the folder is gone
+                sig = gen = None
+            except Exception as e:
+                # unreadable (e.g. a broken alias file): keep what we had
+                # and only look again once the folder changes
+                print("Cannot read genome %s: %r" % (folder, e), file=sys.stderr)
+                with self.lock:
+                    self.signatures[folder] = sig
+                continue
+            with self.lock:
+                if gen is None:
+                    self.signatures.pop(folder, None)
+                    if self.genomes.pop(folder, None) is None:
+                        continue
+                else:
+                    self.genomes[folder] = gen
+                    self.signatures[folder] = sig
+            changed.add(folder)
+        if changed:
+            with self.lock:
+                self.version += 1
+        return changed
+
+    def save(self, file_name):
+        """writes the inventory for genome_inventory.py"""
+        with self.lock:
+            gens = list(self.genomes.values())
+        write_inventory_file(file_name, gens, self.directory)
+
+    def report(self, kind):
+        """returns (content type, body) of the html, xls or json report,
+        rendering it only once per version"""
+        with self.lock:
+            version = self.version
+            cached = self._reports.get(kind)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            gens = list(self.genomes.values())
+        if kind == "html":
+            report = ("text/html; charset=utf-8", html_content(gens, EXCEL_FILE_NAME).encode())
+        elif kind == "xls":
+            report = ("application/vnd.ms-excel", excel_sheet(gens).save_to_memory("xls").getvalue())
+        else:
+            report = ("application/json", inventory_content(gens, self.directory).encode())
+        with self.lock:
+            self._reports[kind] = (version, report)
+        return report
+
+
+class InotifyWatcher:
+    """minimal inotify binding (Linux only) reporting which genome
+    folders changed; raises OSError where inotify is unavailable"""
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+            | IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, directory):
+        self.directory = directory
+        try:
+            self.libc = ctypes.CDLL(None, use_errno=True)
+            self.fd = self.libc.inotify_init()
+        except (OSError, AttributeError):
+            raise OSError("inotify is not available")
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+        # watch descriptor -> genome folder, None for folders listing genomes
+        self.folders = {}
+
+    def add(self, path, folder):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.MASK)
+        if wd >= 0:
+            self.folders[wd] = folder
+
+    def watch_all(self, genome_folders):
+        """watches the directory, the folders genomes are listed in,
+        every genome and the index folders inside them"""
+        self.add(self.directory, None)
+        for name in GenomeInfo.to_go_down:
+            if os.path.isdir(self.directory + "/" + name):
+                self.add(self.directory + "/" + name, None)
+        for folder in genome_folders:
+            self.watch_genome(folder)
+
+    def watch_genome(self, folder):
+        path = self.directory + "/" + folder
+        self.add(path, folder)
+        for name in GenomeInfo.folder_names:
+            if os.path.isdir(path + "/" + name):
+                self.add(path + "/" + name, folder)
+
+    def wait(self, timeout):
+        """blocks until something changes or timeout runs out; returns the
+        set of changed genome folders (None in it means relist everything)"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        # let a burst of changes (e.g. an index being built) settle
+        time.sleep(SETTLE_SECONDS)
+        changed = set()
+        while select.select([self.fd], [], [], 0)[0]:
+            buf = os.read(self.fd, 65536)
+            offset = 0
+            while offset < len(buf):
+                wd, mask, _, length = self.EVENT.unpack_from(buf, offset)
+                offset += self.EVENT.size + length
+                if mask & self.IN_Q_OVERFLOW:
+                    changed.add(None)
+                elif mask & self.IN_IGNORED:
+                    self.folders.pop(wd, None)
+                elif wd in self.folders:
+                    changed.add(self.folders[wd])
+        return changed
+
+
+def save(inventory, inventory_file):
+    """saves the inventory, only warning if it cannot be written"""
+    try:
+        inventory.save(inventory_file)
+    except EnvironmentError as e:
+        print("Cannot save the inventory: %s" % e, file=sys.stderr)
+
+
+def keep_current(inventory, poll_seconds, inventory_file=None):
+    """refreshes the inventory forever: on inotify events when available,
+    and by polling modification times every poll_seconds regardless"""
+    try:
+        watcher = InotifyWatcher(inventory.directory)
+        watcher.watch_all(inventory.genomes)
+    except OSError as e:
+        print("Falling back to polling: %s" % e, file=sys.stderr)
+        watcher = None
+    next_poll = time.monotonic() + poll_seconds
+    while True:
+        folders = set()
+        if watcher is not None:
+            folders = watcher.wait(max(0, next_poll - time.monotonic()))
+        else:
+            time.sleep(max(0, next_poll - time.monotonic()))
+        if time.monotonic() >= next_poll or None in folders:
+            # NFS changes made on other hosts only show up this way
+            folders = None
+            next_poll = time.monotonic() + poll_seconds
+        elif not folders:
+            continue
+        # whatever goes wrong, this thread must live on to keep the inventory current
+        try:
+            changed = inventory.refresh(folders)
+            if changed:
+                print("Updated %s" % ", ".join(sorted(changed)), file=sys.stderr)
+                if inventory_file is not None:
+                    save(inventory, inventory_file)
+                if watcher is not None:
+                    for folder in changed & set(inventory.genomes):
+                        watcher.watch_genome(folder)
+        except Exception as e:
+            print("Cannot refresh: %r" % e, file=sys.stderr)
+
+
+def make_handler(inventory):
+    """request handler serving the reports of inventory"""
+    routes = {"/": "html", "/index.html": "html",
+              "/" + EXCEL_FILE_NAME: "xls", "/" + JSON_FILE_NAME: "json"}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            kind = routes.get(self.path.split("?", 1)[0])
+            if kind is None:
+                self.send_error(404)
+                return
+            try:
+                content_type, body = inventory.report(kind)
+            except ImportError as e:
+                self.send_error(501, str(e))
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def serve(directory, port, poll_seconds, inventory_file=None):
+    """scans directory once, then serves it while keeping it current"""
+    if inventory_file is None:
+        inventory_file = default_inventory_file(directory)
+    inventory = GenomeInventory(directory)
+    try:
+        inventory.refresh()
+    except EnvironmentError as e:
+        print_and_exit(str(e))
+    save(inventory, inventory_file)
+    print("Serving %d genomes from %s on http://%s:%d/" % (len(inventory.genomes), directory, HOST, port),
+          file=sys.stderr)
+    threading.Thread(target=keep_current, args=(inventory, poll_seconds, inventory_file), daemon=True).start()
+    server = ThreadingHTTPServer((HOST, port), make_handler(inventory))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or len(sys.argv) > 5:
+        print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION)
+    try:
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PORT
+        poll_seconds = float(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_POLL_SECONDS
+    except ValueError:
+        print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION+"\nport and poll_seconds must be numbers\n")
+    serve(sys.argv[1], port, poll_seconds, sys.argv[4] if len(sys.argv) > 4 else None)
@@ -2,7 +2,17 @@
 # Written by Alex Ding, 2018
 
 import os, sys
-import pyexcel as pe
+import datetime
+import json
+try:
+    import pyexcel as pe
+except ImportError:
+    # only needed to write the EXCEL file
+    pe = None
+
+# the shared barc package lives at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from barc.instrument import Instrument, INSTRUMENT_USAGE
 
 # Note: need to install pyexcel and pyexcel-xls and pyexcel-xlsx
 # https://github.com/pyexcel/pyexcel
@@ -13,15 +23,22 @@ PROGRAM_DESCRIPTION = """
 Generates an HTML page or EXCEL file outlining 
  a table providing information about whether or
  not certain genetic datum of a species is present
+ (plus a JSON inventory for genome_inventory.py)
 """
 USAGE_DESCRIPTION = """
 Usage: %s <directory> <output_filename>
 Example: %s /nfs/genomes/ BaRC_genomes
 Note: omit extension in output_filename
-""" % (sys.argv[0], sys.argv[0])
-HEADER_FILE_NAME = "header.html"
-TABLE_FILE_NAME = "table.html"
-FOOTER_FILE_NAME = "footer.html"
+The inventory is also saved as $GENOME_INVENTORY, or else
+ <directory>/genome_inventory.json, for genome_inventory.py
+""" % (sys.argv[0], sys.argv[0]) + INSTRUMENT_USAGE
+# the html templates live next to this script
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+HEADER_FILE_NAME = os.path.join(TEMPLATE_DIR, "header.html")
+TABLE_FILE_NAME = os.path.join(TEMPLATE_DIR, "table.html")
+FOOTER_FILE_NAME = os.path.join(TEMPLATE_DIR, "footer.html")
+# where genome_inventory.py looks for the inventory of a genomes directory
+INVENTORY_FILE_NAME = "genome_inventory.json"
 
 
 def row_td(info, color=None):
@@ -75,6 +92,24 @@ class GenomeInfo:
                 self.assembly_aliases.append(line[:-1])
             alias.close()
 
+    def to_dict(self):
+        """returns the info as a plain dict, e.g. for JSON"""
+        return {"directory": self.folder_name,
+                "scientific_name": self.scientific_name,
+                "common_name": self.common_name,
+                "assembly_aliases": list(self.assembly_aliases),
+                "folders_presence": dict(self.folders_presence)}
+
+    @classmethod
+    def from_dict(cls, info):
+        """rebuilds a GenomeInfo from to_dict's output"""
+        gen = cls(info["directory"])
+        gen.scientific_name = info["scientific_name"]
+        gen.common_name = info["common_name"]
+        gen.assembly_aliases = list(info["assembly_aliases"])
+        gen.folders_presence.update(info["folders_presence"])
+        return gen
+
     def row(self):
         """generates HTML row based on the current info"""
         content = row_td("<b>" + self.scientific_name + "</b>") + row_td(self.common_name) + row_td(self.folder_name)
@@ -95,44 +130,50 @@ def generate_gene_info(directory, folder_name):
     gen.populate(directory+"/"+folder_name)
     return gen
 
-def write_html_file(html_file_name, directory):
-    """takes a file name and write everything as needed"""
-    html_file = open(html_file_name, "w")
-
-    # write the header
-    with open(HEADER_FILE_NAME, "r") as header:
-        content = header.read()
-        html_file.write(content)
-    # fill in the file name for the corresponding excel file
-    html_file.write(html_file_name[:-5]+".xls")
-
-    # write the head of the table
-    with open(TABLE_FILE_NAME, "r") as table:
-        content = table.read()
-        html_file.write(content)
-
-    # fill in custom data into the table
+def list_genome_folders(directory):
+    """lists the genome folders (relative to directory) worth reporting"""
     if not os.path.exists(directory):
-        print_and_exit("%s does not exist or cannot be accessed" % directory)
+        raise EnvironmentError("%s does not exist or cannot be accessed" % directory)
     files = next(os.walk(directory))[1]
-    gens = []
+    folders = []
     for file_ in files:
         if file_ in GenomeInfo.to_go_down:
             subfiles = next(os.walk(directory+"/"+file_))[1]
             for subfile_ in subfiles:
-                gens.append(generate_gene_info(directory, file_+"/"+subfile_))
+                folders.append(file_+"/"+subfile_)
         elif file_ not in GenomeInfo.to_skip:
-            gens.append(generate_gene_info(directory, file_))
+            folders.append(file_)
+    return folders
+
+def collect_genomes(directory):
+    """scans directory once and returns the GenomeInfo of every genome"""
+    return [generate_gene_info(directory, folder) for folder in list_genome_folders(directory)]
+
+def html_content(gens, excel_file_name):
+    """returns the whole HTML page for the genomes"""
+    content = []
+    # write the header
+    with open(HEADER_FILE_NAME, "r") as header:
+        content.append(header.read())
+    # fill in the file name for the corresponding excel file
+    content.append(excel_file_name)
+
+    # write the head of the table
+    with open(TABLE_FILE_NAME, "r") as table:
+        content.append(table.read())
 
-    # loop through the resulting list to append properly to the HTML
+    # loop through the genomes to append properly to the HTML
     for gen in sorted(gens, key=lambda x: x.scientific_name):
-        html_file.write(gen.row())
+        content.append(gen.row())
     # write the footer
     with open(FOOTER_FILE_NAME, "r") as footer:
-        content = footer.read()
-        html_file.write(content)
+        content.append(footer.read())
+    return "".join(content)
 
-    html_file.close()
+def write_html_file(html_file_name, gens):
+    """takes a file name and write everything as needed"""
+    with open(html_file_name, "w") as html_file:
+        html_file.write(html_content(gens, html_file_name[:-5]+".xls"))
 
 def insert_dict(content, gen):
     """insert the information of one entry into the dictionary"""
@@ -160,8 +201,10 @@ def dict_to_array(content):
             result[i].append(content[name][i-1])
     return result
 
-def write_excel_file(output_filename, directory):
-    """takes a file name, creates the EXCEL file, and writes as needed"""
+def excel_sheet(gens):
+    """makes the EXCEL sheet for the genomes"""
+    if pe is None:
+        raise ImportError("pyexcel and pyexcel-xls are needed to write EXCEL files")
     # initialize dict
     content = dict()
     content["Scientific Name"] = []
@@ -170,33 +213,71 @@ def write_excel_file(output_filename, directory):
     content["Assembly Alias(es)"] = []
     for name in GenomeInfo.folder_names:
         content[name] = []
-    if not os.path.exists(directory):
-        print_and_exit("%s does not exist or cannot be accessed" % directory)
-    files = next(os.walk(directory))[1]
-    gens = []
-    
-    for file_ in files:
-        if file_ in GenomeInfo.to_go_down:
-            subfiles = next(os.walk(directory+"/"+file_))[1]
-            for subfile_ in subfiles:
-                gen = GenomeInfo(file_+"/"+subfile_)
-                gen.populate(directory+"/"+file_+"/"+subfile_)
-                gens.append(gen)
-        elif file_ not in GenomeInfo.to_skip:
-                gen = GenomeInfo(file_)
-                gen.populate(directory+"/"+file_)
-                gens.append(gen)
     for gen in sorted(gens, key=lambda g:g.scientific_name):
         insert_dict(content, gen)
-    sheet = pe.Sheet(dict_to_array(content))
-    sheet.save_as(output_filename)
+    return pe.Sheet(dict_to_array(content))
+
+def write_excel_file(output_filename, gens):
+    """takes a file name, creates the EXCEL file, and writes as needed"""
+    excel_sheet(gens).save_as(output_filename)
+
+def inventory_content(gens, directory):
+    """returns the JSON inventory of the genomes found under directory"""
+    inventory = {"directory": os.path.abspath(directory),
+                 "generated": datetime.datetime.now().isoformat(timespec="seconds"),
+                 "genomes": [gen.to_dict() for gen in sorted(gens, key=lambda g: g.folder_name)]}
+    return json.dumps(inventory, indent=1)
 
-def depatchBothExtensions(output_filename, directory):
+def write_inventory_file(file_name, gens, directory):
+    """writes the JSON inventory for genome_inventory.py; the file is
+    replaced in one go so readers never see it half written"""
+    temp_name = "%s.%d.tmp" % (file_name, os.getpid())
+    with open(temp_name, "w") as f:
+        f.write(inventory_content(gens, directory))
+    os.replace(temp_name, file_name)
+
+def default_inventory_file(directory):
+    """$GENOME_INVENTORY if set, else the inventory file inside directory"""
+    return os.environ.get("GENOME_INVENTORY") or os.path.join(directory, INVENTORY_FILE_NAME)
+
+def read_inventory_file(file_name):
+    """returns (directory, list of GenomeInfo) from write_inventory_file's output"""
+    with open(file_name) as f:
+        inventory = json.load(f)
+    return inventory["directory"], [GenomeInfo.from_dict(info) for info in inventory["genomes"]]
+
+def depatchBothExtensions(output_filename, directory, instrument):
     """determines the extension and dispatches to correct function"""
-    write_html_file(output_filename+".html", directory)
-    write_excel_file(output_filename+".xls", directory)
+    # scan once for both files
+    with instrument.stage("scan"):
+        try:
+            gens = collect_genomes(directory)
+        except EnvironmentError as e:
+            print_and_exit(str(e))
+        instrument.count(len(gens))
+    with instrument.stage("html"):
+        write_html_file(output_filename+".html", gens)
+    with instrument.stage("json"):
+        write_inventory_file(output_filename+".json", gens, directory)
+        # also where genome_inventory.py and the flank tool read it
+        try:
+            write_inventory_file(default_inventory_file(directory), gens, directory)
+        except EnvironmentError as e:
+            print("Cannot save the inventory: %s" % e, file=sys.stderr)
+    with instrument.stage("excel"):
+        try:
+            write_excel_file(output_filename+".xls", gens)
+        except ImportError as e:
+            print_and_exit(str(e))
+
+if __name__ == "__main__":
+    # take out --progress/--profile/--summary before counting arguments
+    try:
+        instrument = Instrument.from_argv("nfs_genome_html", sys.argv)
+    except ValueError as e:
+        print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION+str(e))
 
-if len(sys.argv) != 3:
-    print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION)
+    if len(sys.argv) != 3:
+        print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION)
 
-depatchBothExtensions(sys.argv[2], sys.argv[1])
+    instrument.run(depatchBothExtensions, sys.argv[2], sys.argv[1], instrument)
@@ -1 +1,4 @@
-./rm_WI_Illumina_suffix.STDIN.py < sample_input.txt > sample_output.txt
\ No newline at end of file
+./rm_WI_Illumina_suffix.STDIN.py < sample_input.txt > sample_output.txt
+./rm_WI_Illumina_suffix.STDIN.py --rule=casava --rule=strip_barcode < casava_input.txt > casava_output.txt
+./rm_WI_Illumina_suffix.STDIN.py '--rule=s|:8:1101:|:|' < casava_output.txt > custom_output.txt
+./rm_WI_Illumina_suffix.STDIN.py --qc=sample_qc.json < sample_input.txt > sample_output.txt
@@ -1,58 +1,244 @@
 #!/usr/bin/env python3
 # Written by Alex Ding, 2018
 
-import sys
+import os, sys
+import collections
+import itertools
+import json
+import re
+
+# the shared barc package lives at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from barc import fastio
+from barc.instrument import Instrument, INSTRUMENT_USAGE
 
 PROGRAM_DESCRIPTION = """
 Remove special suffix appearing in WI Illumina fastq files
  by changing /1;0 and /2;0 in the read description
- (lines begin with @ and +) to /1 and /2
+ (lines begin with @ and +) to /1 and /2.
+ Other header normalizations can be done in the same pass
+ with --rule, applied in the order given
 """
 
-USAGE_DESCRIPTION = "\nUSAGE: python %s < foo.fastq > foo_noSuffix.fastq\n" % sys.argv[0]
+USAGE_DESCRIPTION = """
+USAGE: python %s [--rule=RULE ...] [--qc=FILE] < foo.fastq > foo_noSuffix.fastq
+Example: python %s --rule=casava --rule=strip_comment < foo.fastq > foo_clean.fastq
+ --qc=FILE writes read count, read length histogram, mean quality per
+ position, GC fraction and mate 1/2 counts (from /1 and /2 after the
+ rules) as JSON, collected in the same pass
+Rules (default wi_suffix):
+%s
+ s|PATTERN|REPLACEMENT|  any regular expression substitution, applied to each
+                         read description (any delimiter instead of |)
+""" % (sys.argv[0], sys.argv[0], "%s") + INSTRUMENT_USAGE
 
 def print_and_exit(s):
     """prints the error message and exits"""
     print(s, file=sys.stderr)
     sys.exit()
 
+class Rule:
+    """one compiled byte-level substitution on read descriptions; the
+    pattern is matched per line, a strict rule must match every line"""
+    def __init__(self, name, pattern, replacement, strict=False):
+        self.name = name
+        # ^ and $ are the ends of each read description in the block
+        self.regex = re.compile(pattern, re.MULTILINE)
+        self.replacement = replacement
+        self.strict = strict
+
+    def apply(self, descriptions):
+        """rewrites a batch of descriptions with one pass over them joined"""
+        block, n = self.regex.subn(self.replacement, b"\n".join(descriptions))
+        if self.strict and n != len(descriptions):
+            raise ValueError("File not complying to format")
+        rewritten = block.split(b"\n")
+        if len(rewritten) != len(descriptions):
+            raise ValueError("Rule %s changed the number of lines, check for \\n or \\s in it" % self.name)
+        return rewritten
+
+class FunctionRule:
+    """a rule written as a Python function over a batch of descriptions,
+    for rewrites that slicing does faster than a regular expression"""
+    def __init__(self, name, function):
+        self.name = name
+        self.apply = function
+
+# name -> (description, [(pattern, replacement, strict) or function, ...])
+RULES = {}
+
+def register_rule(name, description, *substitutions):
+    """makes a rule available to --rule; each substitution is
+    (pattern, replacement, strict) on bytes or a function taking and
+    returning a list of descriptions"""
+    RULES[name] = (description, list(substitutions))
 
-# note that the file has read descriptions on all the odd lines
+# the file has read descriptions on all the odd lines
 # they all start with "@" or "+" and end with "/1;0" and "/2;0"
 # we change "/1;0" and "/2;0" into "/1" and "/2" and keep everything
 # else the same
 def parse_line(l):
-    """parses one single line and prints it after revision"""
-    # check validity of the line
-    if l[0] == "@" or l[0] == "+":
-        # print everything prior to the end bit (which is /1;0 or /2;0)
-        # [:-5] -> everything prior to the last 4 characters
-        print(l[:-5], end="")
-        # check which one it is and print accordingly
-        if l[-4] == "1":
-            print("/1")
-        elif l[-4] == "2":
-            print("/2")
+    """parses one single line (bytes, without newline) and returns it after revision"""
+    # keep everything prior to the end bit (which is /1;0 or /2;0)
+    # [:-4] -> everything prior to the last 4 characters
+    # check which one it is and append accordingly
+    if l[-3:-2] == b"1":
+        return l[:-4] + b"/1"
+    elif l[-3:-2] == b"2":
+        return l[:-4] + b"/2"
+    raise ValueError("File not complying to format")
+
+register_rule("wi_suffix", "@read/1;0 -> @read/1 (every description must have it)",
+              lambda descriptions: [parse_line(l) for l in descriptions])
+# Casava 1.8: "@read 1:N:0:ACGT" -> "@read/1"
+register_rule("casava", "@read 1:N:0:ACGT -> @read/1",
+              (rb"^([^ \t\n]+)[ \t]+([12]):[YN]:[0-9]+:[^ \t\n]*$", rb"\1/\2", False))
+# index barcodes: "@read#ACGT/1" -> "@read/1" and "1:N:0:ACGT" -> "1:N:0:"
+register_rule("strip_barcode", "@read#ACGT/1 -> @read/1, 1:N:0:ACGT -> 1:N:0:",
+              (rb"#[A-Za-z0-9+]*(/[12])?$", rb"\1", False),
+              (rb"([ \t][12]:[YN]:[0-9]+:)[^ \t\n]+$", rb"\1", False))
+register_rule("strip_comment", "@read comment -> @read",
+              (rb"^([^ \t\n]+)[ \t].*$", rb"\1", False))
+
+# a description must start with @ or +
+BAD_DESCRIPTION = re.compile(rb"^[^@+]", re.MULTILINE)
+
+def compile_rules(names):
+    """turns rule names or s|pattern|replacement| specs into Rules"""
+    rules = []
+    for name in names:
+        if name in RULES:
+            rules.extend(FunctionRule(name, substitution) if callable(substitution) else Rule(name, *substitution)
+                         for substitution in RULES[name][1])
+        elif len(name) > 3 and name[0] == "s" and name.count(name[1]) == 3 and name.endswith(name[1]):
+            _, pattern, replacement, _ = name.split(name[1])
+            try:
+                rules.append(Rule(name, os.fsencode(pattern), os.fsencode(replacement)))
+            except re.error as e:
+                raise ValueError("Invalid rule %s: %s" % (name, e))
         else:
-            print_and_exit("File not complying to format")
-    else:
-        print_and_exit("File not complying to format")
+            raise ValueError("Unknown rule %s" % name)
+    return rules
+
+def rewrite_descriptions(descriptions, rules):
+    """applies every rule in turn to a whole batch of read descriptions"""
+    # check validity of the lines
+    if BAD_DESCRIPTION.search(b"\n".join(descriptions)):
+        raise ValueError("File not complying to format")
+    for rule in rules:
+        descriptions = rule.apply(descriptions)
+    return descriptions
+
+# fastq qualities are phred+33
+QUALITY_OFFSET = 33
 
-count = 0
+class FastqStats:
+    """QC statistics accumulated over blocks of fastq lines"""
+    def __init__(self):
+        self.reads = 0
+        self.bases = 0
+        self.gc = 0
+        self.mates = [0, 0]
+        self.lengths = collections.Counter()
+        self.quality_lengths = collections.Counter()
+        # sum of the quality characters at each position
+        self.quality_sums = []
+
+    def add(self, lines, first):
+        """adds a block of lines whose first line is line number first (0-based)
+        of the file; works a whole block at a time with bytes methods and
+        zip so the inner loops run in C"""
+        descriptions = lines[-first % 4::4]
+        seqs = lines[(1-first) % 4::4]
+        quals = lines[(3-first) % 4::4]
+        self.reads += len(seqs)
+        self.lengths.update(map(len, seqs))
+        bases = b"".join(seqs)
+        self.bases += len(bases)
+        self.gc += bases.count(b"G") + bases.count(b"C") + bases.count(b"g") + bases.count(b"c")
+        names = b"\n".join(descriptions) + b"\n"
+        self.mates[0] += names.count(b"/1\n")
+        self.mates[1] += names.count(b"/2\n")
+        self.quality_lengths.update(map(len, quals))
+        # column p of zip_longest holds the p-th quality of every read
+        for p, column in enumerate(itertools.zip_longest(*quals, fillvalue=0)):
+            if p == len(self.quality_sums):
+                self.quality_sums.append(0)
+            self.quality_sums[p] += sum(column)
+
+    def summary(self):
+        """returns the statistics as a dict for JSON"""
+        # reads with a quality at each position: those longer than it
+        covering = []
+        remaining = sum(self.quality_lengths.values())
+        for p in range(len(self.quality_sums)):
+            remaining -= self.quality_lengths.get(p, 0)
+            covering.append(remaining)
+        return {"reads": self.reads,
+                "bases": self.bases,
+                "gc_fraction": round(self.gc / self.bases, 4) if self.bases else None,
+                "mate_1": self.mates[0],
+                "mate_2": self.mates[1],
+                "length_histogram": dict((str(length), n) for length, n in sorted(self.lengths.items())),
+                "mean_quality": [round(total / n - QUALITY_OFFSET, 2) if n else None
+                                 for total, n in zip(self.quality_sums, covering)]}
+
+def rewrite(input_file, output, rules, instrument, stats=None):
+    """rewrites every read description in input_file block by block,
+    returns the number of lines read"""
+    count = 0
+    for lines in fastio.read_lines(input_file, progress=instrument.progress):
+        # if the block starts on a description it's on lines 1, 3, 5...
+        # otherwise on 2, 4, 6...
+        first = count % 2
+        lines[first::2] = rewrite_descriptions(lines[first::2], rules)
+        fastio.write_lines(output, lines)
+        if stats is not None:
+            stats.add(lines, count)
+        count = count + len(lines)
+        # four lines to a read
+        instrument.count(count // 4 - (count - len(lines)) // 4)
+    return count
+
+def main(rules, qc_filename, instrument):
+    """rewrites stdin to stdout"""
+    stats = FastqStats() if qc_filename is not None else None
+    input_file = fastio.open_input("-")
+    # whatever was rewritten before an error is still flushed on exit
+    with fastio.open_output("-") as output, \
+         instrument.stage("rewrite", total=fastio.input_size(input_file)):
+        try:
+            count = rewrite(input_file, output, rules, instrument, stats)
+        except ValueError as e:
+            print_and_exit(str(e))
+
+    if count == 0:
+        print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION)
+    if stats is not None:
+        with open(qc_filename, "w") as f:
+            json.dump(stats.summary(), f, indent=1)
+            f.write("\n")
+
+USAGE_DESCRIPTION = USAGE_DESCRIPTION % "\n".join(" %-24s%s" % (name, RULES[name][0]) for name in RULES)
+
+try:
+    instrument = Instrument.from_argv("rm_WI_Illumina_suffix", sys.argv)
+    qc_filename = None
+    rule_names = []
+    # the fastq comes on stdin, so every argument is an option
+    for arg in sys.argv[1:]:
+        if arg.startswith("--qc=") and len(arg) > len("--qc="):
+            qc_filename = arg[len("--qc="):]
+        elif arg.startswith("--rule="):
+            rule_names.append(arg[len("--rule="):])
+        else:
+            raise ValueError("Unknown argument %s (options take the form --qc=FILE and --rule=RULE)\n" % arg)
+    rules = compile_rules(rule_names or ["wi_suffix"])
+except ValueError as e:
+    print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION+str(e))
 
 # check if stdin is empty
 if sys.stdin.isatty():
     print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION)
-else:
-    for line in sys.stdin:
-        # if it's line 1, 3, 5...
-        if count % 2 == 0:
-            # process it
-            parse_line(line)
-        else:
-            # just print the original line
-            print(line, end="")
-        count = count + 1
 
-if count == 0:
-    print_and_exit(PROGRAM_DESCRIPTION+USAGE_DESCRIPTION)
\ No newline at end of file
+instrument.run(main, rules, qc_filename, instrument)